@@ -1,6 +1,11 @@
+import profiler
 from spotify_api_interface import (
     get_token,
     create_and_populate_playlist,
+    create_and_populate_playlists,
+    create_candidate_pool,
+    check_exclusion_rules,
+    partition_candidate_pool,
     get_all_artists_listenned_to,
     get_user_href,
     create_track_list,
@@ -41,8 +46,64 @@ def main():
         action="store_true",
         help="do not include recommendations from playlist artists",
     )
+    parser.add_argument(
+        "--max_requests",
+        type=int,
+        help="maximum number of recommendation requests, 50 by default (25 per playlist with --multi_playlist)",
+    )
+    parser.add_argument(
+        "--time_budget",
+        type=float,
+        help="maximum number of seconds spent getting recommendations, no limit by default",
+    )
+    parser.add_argument(
+        "--multi_playlist",
+        choices=["genre", "source"],
+        help="with --create_playlist, create several playlists from one candidate pool, split by genre or by source",
+    )
+    parser.add_argument("--nb_playlists", type=int, default=3, help="number of playlists with --multi_playlist")
+    parser.add_argument(
+        "--exclusion_rules",
+        help="json file with the exclusion rules of each playlist with --multi_playlist (see README)",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="time every stage (wall, cpu, sleep, network, peak memory) and write a chrome trace file",
+    )
+    parser.add_argument(
+        "--profile_cprofile",
+        action="store_true",
+        help="same as --profile and also dump a cProfile file for each top level stage",
+    )
 
     args = parser.parse_args()
+    if args.multi_playlist and not args.create_playlist:
+        parser.error("--multi_playlist requires --create_playlist")
+    if args.nb_playlists < 1:
+        parser.error("--nb_playlists must be at least 1")
+    if args.max_requests is not None and args.max_requests < 1:
+        parser.error("--max_requests must be at least 1")
+    if args.time_budget is not None and args.time_budget <= 0:
+        parser.error("--time_budget must be positive")
+    if args.exclusion_rules:
+        if not args.multi_playlist:
+            parser.error("--exclusion_rules requires --multi_playlist")
+        try:
+            with open(args.exclusion_rules, "r") as f:
+                args.exclusion_rules = json.load(f)
+            check_exclusion_rules(args.exclusion_rules, args.multi_playlist)
+        except (OSError, ValueError) as e:
+            parser.error(f"--exclusion_rules: {e}")
+    if args.profile or args.profile_cprofile:
+        profiler.enable(use_cprofile=args.profile_cprofile)
+    try:
+        run(args)
+    finally:
+        profiler.report()
+
+
+def run(args):
     # Load environment variables from the .env file
     load_dotenv()
 
@@ -52,52 +113,118 @@ def main():
         logging.error("Client ID not found in the .env file.")
         exit()
 
-    if not os.path.exists("../local_storage"):
-        os.makedirs("../local_storage")
-    try:
-        with open("../local_storage/access_token.json", "r") as f:
-            access_token = json.load(f).strip()
-    except FileNotFoundError:
-        logging.warning("access_token.json not found")
-        access_token = "invalid token"
-    except json.decoder.JSONDecodeError:
-        logging.warning("access_token.json empty")
-        access_token = "invalid token"
-
-    if not check_saved_access_token_valid(access_token):
-        access_token = get_token(
-            client_id,
-            "playlist-modify-private, \
-            playlist-read-private, \
-            playlist-read-collaborative, \
-            user-top-read, \
-            user-read-recently-played",
+    with profiler.stage("token check"):
+        if not os.path.exists("../local_storage"):
+            os.makedirs("../local_storage")
+        try:
+            with open("../local_storage/access_token.json", "r") as f:
+                access_token = json.load(f).strip()
+        except FileNotFoundError:
+            logging.warning("access_token.json not found")
+            access_token = "invalid token"
+        except json.decoder.JSONDecodeError:
+            logging.warning("access_token.json empty")
+            access_token = "invalid token"
+
+        if not check_saved_access_token_valid(access_token):
+            access_token = get_token(
+                client_id,
+                "playlist-modify-private, \
+                playlist-read-private, \
+                playlist-read-collaborative, \
+                user-top-read, \
+                user-read-recently-played",
+            )
+            with open("../local_storage/access_token.json", "w") as f:
+                json.dump(access_token, f)
+
+    with profiler.stage("user lookup"):
+        user_href = get_user_href(access_token)
+
+    with profiler.stage("collection"):
+        if args.collect_data:
+            all_artists = get_all_artists_listenned_to(access_token)
+            with open("../local_storage/all_artists_listenned_to.json", "w") as f:
+                json.dump(all_artists, f)
+        else:
+            with open("../local_storage/all_artists_listenned_to.json", "r") as f:
+                all_artists = json.load(f)
+
+    if args.create_playlist and args.multi_playlist:
+        create_multiple_playlists(args, access_token, user_href, all_artists)
+    elif args.create_playlist:
+        with profiler.stage("track list creation"):
+            track_list = create_track_list(
+                access_token,
+                all_artists,
+                args.no_recommendation_from_playlist_artists,
+                max_requests=args.max_requests or 50,
+                time_budget=args.time_budget,
+            )
+            with open("../local_storage/track_list.json", "w") as f:
+                json.dump(track_list, f)
+            with open("../local_storage/track_list.json", "r") as f:
+                track_list = json.load(f)
+        if not track_list:
+            logging.error("No track found to create the playlist from")
+            return
+        with profiler.stage("playlist creation"):
+            now = datetime.now().strftime("%d/%m/%Y %H:%M")
+            playlist_name = "True discover weekly " + now
+            create_and_populate_playlist(
+                access_token,
+                user_href,
+                track_list,
+                playlist_name=playlist_name,
+                playlist_description="get truly never heard before music for you!",
+            )
+
+
+def create_multiple_playlists(args, access_token, user_href, all_artists):
+    exclusion_rules = args.exclusion_rules or {}
+    if args.no_recommendation_from_playlist_artists:
+        exclusion_rules.setdefault("default", {})["exclude_playlist_seed_artists"] = True
+
+    with profiler.stage("candidate pool creation"):
+        candidate_pool = create_candidate_pool(
+            access_token,
+            all_artists,
+            max_requests=args.max_requests or 25 * args.nb_playlists,
+            time_budget=args.time_budget,
+            exclusion_rules=exclusion_rules,
         )
-        with open("../local_storage/access_token.json", "w") as f:
-            json.dump(access_token, f)
-
-    user_href = get_user_href(access_token)
-    if args.collect_data:
-        all_artists = get_all_artists_listenned_to(access_token)
-        with open("../local_storage/all_artists_listenned_to.json", "w") as f:
-            json.dump(all_artists, f)
-    else:
-        with open("../local_storage/all_artists_listenned_to.json", "r") as f:
-            all_artists = json.load(f)
-
-    if args.create_playlist:
-        track_list = create_track_list(access_token, all_artists, args.no_recommendation_from_playlist_artists)
-        with open("../local_storage/track_list.json", "w") as f:
-            json.dump(track_list, f)
-        with open("../local_storage/track_list.json", "r") as f:
-            track_list = json.load(f)
+        with open("../local_storage/candidate_pool.json", "w") as f:
+            json.dump(candidate_pool, f)
+
+    with profiler.stage("candidate pool partition"):
+        track_lists = partition_candidate_pool(
+            candidate_pool,
+            partition_by=args.multi_playlist,
+            nb_playlists=args.nb_playlists,
+            exclusion_rules=exclusion_rules,
+        )
+        with open("../local_storage/track_lists.json", "w") as f:
+            json.dump(track_lists, f)
+        if len(track_lists) < args.nb_playlists:
+            logging.warning(
+                "only %s playlists out of %s asked: not enough %s groups with tracks left after the exclusion rules",
+                len(track_lists),
+                args.nb_playlists,
+                args.multi_playlist,
+            )
+    if not track_lists:
+        logging.error("No track left to create playlists from")
+        return
+
+    with profiler.stage("playlist creation"):
         now = datetime.now().strftime("%d/%m/%Y %H:%M")
-        playlist_name = "True discover weekly " + now
-        create_and_populate_playlist(
+        playlists = {
+            f"True discover weekly {key} {now}": track_list for key, track_list in track_lists.items()
+        }
+        create_and_populate_playlists(
             access_token,
             user_href,
-            track_list,
-            playlist_name=playlist_name,
+            playlists,
             playlist_description="get truly never heard before music for you!",
         )
 
@@ -0,0 +1,222 @@
+import cProfile
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+
+import requests
+
+_profiler = None
+
+
+class _Profiler:
+    """
+    Collects per-stage timings for one run.
+
+    Every stage records its wall time, CPU time, time spent sleeping,
+    time spent waiting on the network and its tracemalloc peak memory.
+    Stages can be nested, the sleep and network totals of a stage include
+    the ones of its children.
+    """
+
+    def __init__(self, output_folder, use_cprofile):
+        self.output_folder = output_folder
+        self.use_cprofile = use_cprofile
+        self.run_name = time.strftime("%Y%m%d_%H%M%S")
+        self.origin = time.perf_counter()
+        self.sleep_time = 0.0
+        self.network_time = 0.0
+        self.nb_network_calls = 0
+        self.send_depth = 0
+        self.stack = []
+        self.results = []
+        self.trace_events = []
+        self.original_send = None
+
+    def timestamp_us(self, counter_value):
+        return (counter_value - self.origin) * 1e6
+
+    def add_trace_event(self, name, category, start, end, args=None):
+        self.trace_events.append(
+            {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": self.timestamp_us(start),
+                "dur": (end - start) * 1e6,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": args or {},
+            }
+        )
+
+
+def enable(output_folder="../local_storage/profile", use_cprofile=False):
+    """
+    Turns profiling on for the rest of the run.
+
+    Starts tracemalloc and times every HTTP request sent through `requests`
+    so that network time can be reported separately from CPU work.
+
+    Args:
+        output_folder (str, optional): Folder where the trace file and the
+            cProfile dumps are written. Defaults to "../local_storage/profile".
+        use_cprofile (bool, optional): Dump a cProfile file for each top
+            level stage. Defaults to False.
+    """
+    global _profiler
+    if _profiler is not None:
+        return
+    _profiler = _Profiler(output_folder, use_cprofile)
+    tracemalloc.start()
+
+    original_send = requests.Session.send
+    _profiler.original_send = original_send
+
+    def timed_send(session, request, **kwargs):
+        profiler = _profiler
+        # requests calls send again for every redirect, only the outermost call is timed
+        if profiler is None or profiler.send_depth > 0:
+            return original_send(session, request, **kwargs)
+        profiler.send_depth += 1
+        start = time.perf_counter()
+        try:
+            return original_send(session, request, **kwargs)
+        finally:
+            end = time.perf_counter()
+            profiler.send_depth -= 1
+            profiler.network_time += end - start
+            profiler.nb_network_calls += 1
+            profiler.add_trace_event(f"{request.method} {request.path_url.split('?')[0]}", "network", start, end)
+
+    requests.Session.send = timed_send
+
+
+def sleep(seconds):
+    """
+    Same as time.sleep, the time slept is accounted for when profiling.
+    """
+    start = time.perf_counter()
+    time.sleep(seconds)
+    if _profiler is not None:
+        end = time.perf_counter()
+        _profiler.sleep_time += end - start
+        _profiler.add_trace_event("sleep", "sleep", start, end)
+
+
+@contextlib.contextmanager
+def stage(name):
+    """
+    Profiles the enclosed block as a named stage. Does nothing when
+    profiling is not enabled.
+
+    Args:
+        name (str): Name of the stage, shown in the summary and the trace.
+    """
+    if _profiler is None:
+        yield
+        return
+
+    profiler = _profiler
+    depth = len(profiler.stack)
+    if profiler.stack:
+        # keep the peak reached so far by the parent before resetting it
+        parent = profiler.stack[-1]
+        parent["peak_memory"] = max(parent["peak_memory"], tracemalloc.get_traced_memory()[1])
+    if hasattr(tracemalloc, "reset_peak"):  # python >= 3.9
+        tracemalloc.reset_peak()
+    current = {"peak_memory": 0}
+    profiler.stack.append(current)
+
+    cprofile = None
+    if profiler.use_cprofile and depth == 0:
+        cprofile = cProfile.Profile()
+
+    start_sleep = profiler.sleep_time
+    start_network = profiler.network_time
+    start_nb_network_calls = profiler.nb_network_calls
+    start_cpu = time.process_time()
+    start = time.perf_counter()
+    if cprofile is not None:
+        cprofile.enable()
+    try:
+        yield
+    finally:
+        if cprofile is not None:
+            cprofile.disable()
+        end = time.perf_counter()
+        cpu_time = time.process_time() - start_cpu
+        peak_memory = max(current["peak_memory"], tracemalloc.get_traced_memory()[1])
+        profiler.stack.pop()
+        if profiler.stack:
+            parent = profiler.stack[-1]
+            parent["peak_memory"] = max(parent["peak_memory"], peak_memory)
+
+        result = {
+            "name": name,
+            "depth": depth,
+            "start": start,
+            "wall_time": end - start,
+            "cpu_time": cpu_time,
+            "sleep_time": profiler.sleep_time - start_sleep,
+            "network_time": profiler.network_time - start_network,
+            "nb_network_calls": profiler.nb_network_calls - start_nb_network_calls,
+            "peak_memory": peak_memory,
+        }
+        profiler.results.append(result)
+        trace_args = {key: value for key, value in result.items() if key not in ("name", "depth", "start")}
+        profiler.add_trace_event(name, "stage", start, end, trace_args)
+
+        if cprofile is not None:
+            if not os.path.exists(profiler.output_folder):
+                os.makedirs(profiler.output_folder)
+            stage_file_name = name.replace(" ", "_")
+            cprofile.dump_stats(f"{profiler.output_folder}/{profiler.run_name}_{stage_file_name}.prof")
+
+
+def report():
+    """
+    Logs a summary of every stage and writes the Chrome trace JSON file
+    (open it in chrome://tracing or https://ui.perfetto.dev), then turns
+    profiling off.
+
+    Returns:
+        str: Path of the trace file, None if profiling was not enabled.
+    """
+    global _profiler
+    if _profiler is None:
+        return None
+    profiler = _profiler
+
+    # stages are appended when they finish, sort them back in start order
+    results_by_start = sorted(profiler.results, key=lambda result: result["start"])
+    logging.info("profiling summary (times in s, memory in MiB)")
+    logging.info(
+        "%-32s %9s %9s %9s %9s %9s %9s", "stage", "wall", "cpu", "sleep", "network", "requests", "peak mem"
+    )
+    for result in results_by_start:
+        logging.info(
+            "%-32s %9.2f %9.2f %9.2f %9.2f %9d %9.2f",
+            "  " * result["depth"] + result["name"],
+            result["wall_time"],
+            result["cpu_time"],
+            result["sleep_time"],
+            result["network_time"],
+            result["nb_network_calls"],
+            result["peak_memory"] / (1024 * 1024),
+        )
+
+    if not os.path.exists(profiler.output_folder):
+        os.makedirs(profiler.output_folder)
+    trace_file = f"{profiler.output_folder}/{profiler.run_name}_trace.json"
+    with open(trace_file, "w") as f:
+        json.dump({"traceEvents": profiler.trace_events, "displayTimeUnit": "ms"}, f)
+    logging.info("profiling trace written to %s", trace_file)
+
+    requests.Session.send = profiler.original_send
+    tracemalloc.stop()
+    _profiler = None
+    return trace_file
@@ -10,6 +10,11 @@ import logging
 import json
 from typing import Any
 
+try:
+    from . import profiler
+except ImportError:
+    import profiler
+
 LENGTH = 16
 authorization_code = None
 
@@ -148,29 +153,66 @@ def create_and_populate_playlist(
 ):
     # Create the playlist
     playlist_id = create_playlist(access_token, user_href, playlist_name, playlist_description, public)
-    time.sleep(5)
+    profiler.sleep(5)
     if playlist_id:
         # Add tracks to the created playlist
-        add_tracks_url = f"{user_href}/playlists/{playlist_id}/tracks"
-        headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json",
-        }
-        track_ids = [track["id"] for track in tracks]
-        track_uris = [f"spotify:track:{track_id}" for track_id in track_ids]
+        add_tracks_to_playlist(access_token, user_href, playlist_id, tracks)
+    else:
+        logging.error("Failed to create the playlist")
 
-        if len(track_uris) > 5:
-            track_uris = track_uris[0:100]
-        track_data = {"uris": track_uris}
-        response = requests.post(add_tracks_url, headers=headers, json=track_data)
 
-        if response.status_code == 201:
-            logging.info("Tracks added to the playlist successfully")
+def create_and_populate_playlists(
+    access_token,
+    user_href,
+    playlists,
+    playlist_description="Hello world!",
+    public=False,
+):
+    """
+    Creates several playlists in one batch: all the playlists are created
+    first, then after a single wait all of them are populated.
+
+    Args:
+        access_token (str): Access token for authenticating API requests.
+        user_href (str): User's Spotify API endpoint.
+        playlists (dict): Playlist name -> list of tracks to add.
+        playlist_description (str, optional): Description shared by
+            all the playlists. Defaults to "Hello world!".
+        public (bool, optional): Indicates if the playlists should be
+            public or not. Defaults to False.
+    """
+    playlist_ids = {}
+    for playlist_name in playlists:
+        playlist_ids[playlist_name] = create_playlist(
+            access_token, user_href, playlist_name, playlist_description, public
+        )
+    profiler.sleep(5)
+    for playlist_name, tracks in playlists.items():
+        if playlist_ids[playlist_name]:
+            add_tracks_to_playlist(access_token, user_href, playlist_ids[playlist_name], tracks)
         else:
-            logging.error("Failed to add tracks to the playlist")
-            logging.error("Response: %s", response.text)
+            logging.error("Failed to create the playlist %s", playlist_name)
+
+
+def add_tracks_to_playlist(access_token, user_href, playlist_id, tracks):
+    add_tracks_url = f"{user_href}/playlists/{playlist_id}/tracks"
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": "application/json",
+    }
+    track_ids = [track["id"] for track in tracks]
+    track_uris = [f"spotify:track:{track_id}" for track_id in track_ids]
+
+    if len(track_uris) > 5:
+        track_uris = track_uris[0:100]
+    track_data = {"uris": track_uris}
+    response = requests.post(add_tracks_url, headers=headers, json=track_data)
+
+    if response.status_code == 201:
+        logging.info("Tracks added to the playlist successfully")
     else:
-        logging.error("Failed to create the playlist")
+        logging.error("Failed to add tracks to the playlist")
+        logging.error("Response: %s", response.text)
 
 
 def create_playlist(
@@ -254,7 +296,7 @@ def get_user_items(access_token, item_type, limit=20, total_limit=10000):
     time_ranges = ["short_term", "medium_term", "long_term"]
     for time_range in time_ranges:
         for offset in range(0, total_limit, limit):
-            time.sleep(5)
+            profiler.sleep(5)
             items = get_user_items_page(access_token, item_type, limit, offset, time_range)
             for item in items:
                 item_id = item["id"]
@@ -300,7 +342,7 @@ def get_all_tracks_from_playlists(access_token, playlists):
         "Authorization": f"Bearer {access_token}",
     }
     for playlist in playlists:
-        time.sleep(5)
+        profiler.sleep(5)
         href = playlist["tracks"]["href"]
         response = requests.get(href, headers=headers)
         response_data = response.json()
@@ -366,7 +408,7 @@ def get_all_artists_from_playlists(access_token, playlists):
                         artist_href,
                         playlist["name"],
                     )
-        time.sleep(5)
+        profiler.sleep(5)
 
     # get all the artists in the playlist
     for i in range((len(all_artists_to_add) // max_number_of_artists_to_ask)-1):
@@ -410,93 +452,99 @@ def get_artists_info_from_artist_hrefs(access_token, artist_hrefs):
 def get_all_artists_listenned_to(access_token, store_local = True, local_folder_name = "../local_storage", fetch_local=False):
 
     logging.info("getting all top tracks ...")
-    if fetch_local:
-        with open(f"{local_folder_name}/all_top_tracks.json", "r") as f:
-            all_top_tracks = json.load(f)
-    else:
-        all_top_tracks = get_user_items(access_token, "tracks")
-        if store_local:
-            with open(f"{local_folder_name}/all_top_tracks.json", "w") as f:
-                json.dump(all_top_tracks, f)
+    with profiler.stage("top tracks"):
+        if fetch_local:
+            with open(f"{local_folder_name}/all_top_tracks.json", "r") as f:
+                all_top_tracks = json.load(f)
+        else:
+            all_top_tracks = get_user_items(access_token, "tracks")
+            if store_local:
+                with open(f"{local_folder_name}/all_top_tracks.json", "w") as f:
+                    json.dump(all_top_tracks, f)
     
     logging.info("getting all top artists ...")
-    if fetch_local:
-        with open(f"{local_folder_name}/all_top_artists.json", "r") as f:
-            all_top_artists = json.load(f)
-    else:
-        all_top_artists = get_user_items(access_token, "artists")
-        for artist in all_top_artists:
-            artist.setdefault("sources", []).append("top_artists")
-        if store_local:
-            with open(f"{local_folder_name}/all_top_artists.json", "w") as f:
-                json.dump(all_top_artists, f)
+    with profiler.stage("top artists"):
+        if fetch_local:
+            with open(f"{local_folder_name}/all_top_artists.json", "r") as f:
+                all_top_artists = json.load(f)
+        else:
+            all_top_artists = get_user_items(access_token, "artists")
+            for artist in all_top_artists:
+                artist.setdefault("sources", []).append("top_artists")
+            if store_local:
+                with open(f"{local_folder_name}/all_top_artists.json", "w") as f:
+                    json.dump(all_top_artists, f)
 
     logging.info("getting all playlists ...")
-    if fetch_local:
-        with open(f"{local_folder_name}/all_playlists.json", "r") as f:
-            all_playlists = json.load(f)
-    else:
-        all_playlists = get_user_items(access_token, "playlists")
-        if store_local:
-            with open(f"{local_folder_name}/all_playlists.json", "w") as f:
-                json.dump(all_playlists, f)
+    with profiler.stage("playlists"):
+        if fetch_local:
+            with open(f"{local_folder_name}/all_playlists.json", "r") as f:
+                all_playlists = json.load(f)
+        else:
+            all_playlists = get_user_items(access_token, "playlists")
+            if store_local:
+                with open(f"{local_folder_name}/all_playlists.json", "w") as f:
+                    json.dump(all_playlists, f)
 
     logging.info("getting all playlist artists ...")
-    if fetch_local:
-        with open(f"{local_folder_name}/all_playlists_artists.json", "r") as f:
-            all_playlists_artists = json.load(f)
-    else:
-        all_playlists_artists = get_all_artists_from_playlists(access_token, all_playlists)
-        for artist in all_playlists_artists:
-            artist.setdefault("sources", []).append("playlists")
-        if store_local:
-            with open(f"{local_folder_name}/all_playlists_artists.json", "w") as f:
-                json.dump(all_playlists_artists, f)
+    with profiler.stage("playlist artists"):
+        if fetch_local:
+            with open(f"{local_folder_name}/all_playlists_artists.json", "r") as f:
+                all_playlists_artists = json.load(f)
+        else:
+            all_playlists_artists = get_all_artists_from_playlists(access_token, all_playlists)
+            for artist in all_playlists_artists:
+                artist.setdefault("sources", []).append("playlists")
+            if store_local:
+                with open(f"{local_folder_name}/all_playlists_artists.json", "w") as f:
+                    json.dump(all_playlists_artists, f)
 
     merged_artists = all_playlists_artists
 
-    temp_hrefs = [artist["href"] for artist in merged_artists]
-    unique_artists_hrefs = set(temp_hrefs)
-    artist_hrefs_missing_full_info = []
+    with profiler.stage("artists from top tracks"):
+        temp_hrefs = [artist["href"] for artist in merged_artists]
+        unique_artists_hrefs = set(temp_hrefs)
+        artist_hrefs_missing_full_info = []
+
+        for track in all_top_tracks:
+            for artist in track.get("artists", []):
+                artist_href = artist["href"]
+                if artist_href not in unique_artists_hrefs:
+                    unique_artists_hrefs.add(artist_href)
+                    artist_hrefs_missing_full_info.append(artist_href)
+                else:
+                    for merged_artist in merged_artists:
+                        if merged_artist["href"] == artist_href:
+                            if "top_tracks" not in merged_artist["sources"]:
+                                merged_artist.setdefault("sources", []).append("top_tracks")
+                            break
+
+        if fetch_local:
+            with open(f"{local_folder_name}/artists_from_top_tracks.json", "r") as f:
+                artists_from_top_tracks = json.load(f)
+        else:
+            artists_from_top_tracks = get_artists_info_from_artist_hrefs(access_token, artist_hrefs_missing_full_info)
+            for artist in artists_from_top_tracks:
+                artist.setdefault("sources", []).append("top_tracks")
+            if store_local:
+                with open(f"{local_folder_name}/artists_from_top_tracks.json", "w") as f:
+                    json.dump(artists_from_top_tracks, f)
+
+        for artist in artists_from_top_tracks:
+            merged_artists.append(artist)
 
-    for track in all_top_tracks:
-        for artist in track.get("artists", []):
+    with profiler.stage("merge top artists"):
+        for artist in all_top_artists:
             artist_href = artist["href"]
             if artist_href not in unique_artists_hrefs:
                 unique_artists_hrefs.add(artist_href)
-                artist_hrefs_missing_full_info.append(artist_href)
+                merged_artists.append(artist)
             else:
                 for merged_artist in merged_artists:
                     if merged_artist["href"] == artist_href:
-                        if "top_tracks" not in merged_artist["sources"]:
-                            merged_artist.setdefault("sources", []).append("top_tracks")
+                        merged_artist.setdefault("sources", []).append("top_artists")
                         break
 
-    if fetch_local:
-        with open(f"{local_folder_name}/artists_from_top_tracks.json", "r") as f:
-            artists_from_top_tracks = json.load(f)
-    else:
-        artists_from_top_tracks = get_artists_info_from_artist_hrefs(access_token, artist_hrefs_missing_full_info)
-        for artist in artists_from_top_tracks:
-            artist.setdefault("sources", []).append("top_tracks")
-        if store_local:
-            with open(f"{local_folder_name}/artists_from_top_tracks.json", "w") as f:
-                json.dump(artists_from_top_tracks, f)
-    
-    for artist in artists_from_top_tracks:
-        merged_artists.append(artist)
-
-    for artist in all_top_artists:
-        artist_href = artist["href"]
-        if artist_href not in unique_artists_hrefs:
-            unique_artists_hrefs.add(artist_href)
-            merged_artists.append(artist)
-        else:
-            for merged_artist in merged_artists:
-                if merged_artist["href"] == artist_href:
-                    merged_artist.setdefault("sources", []).append("top_artists")
-                    break
-
     return merged_artists
 
 
@@ -504,6 +552,7 @@ def get_recommendation_from_genre_and_artist(
     access_token,
     genre,
     artist,
+    limit=5,
     recommendation_url: str = "https://api.spotify.com/v1/recommendations",
 ):
     headers = {
@@ -512,7 +561,7 @@ def get_recommendation_from_genre_and_artist(
     params = {}
     params["seed_artists"] = artist
     params["seed_genres"] = genre
-    params["limit"] = 5
+    params["limit"] = limit
 
     response = requests.get(recommendation_url, headers=headers, params=params)
 
@@ -530,7 +579,7 @@ def get_recommendation_from_genre_and_artist(
         exit()
 
 
-def create_track_list(access_token, all_artists, no_recommendation_from_playlist_artists, length=100):
+def get_genres_dict(all_artists):
     genres_dict = {}
     for artist in all_artists:
         if "genres" in artist and artist["genres"]:
@@ -539,66 +588,429 @@ def create_track_list(access_token, all_artists, no_recommendation_from_playlist
                     genres_dict[genre] = [[artist["id"], artist["name"], artist["sources"]]]
                 else:
                     genres_dict[genre].append([artist["id"], artist["name"], artist["sources"]])
-    all_artists_ids = [artist["id"] for artist in all_artists]
+    return genres_dict
+
+
+class SeedSelector:
+    """
+    Chooses the genre and artist used as recommendation seeds, steering
+    the draws toward the seeds whose recommendations end up in the track
+    list (Thompson sampling on the acceptance rate of each genre and each
+    seed artist). Unseen seeds start from the acceptance rate of all the
+    seeds so far, with a weak prior so they still get explored.
+    """
+
+    prior_weight = 2
+
+    def __init__(self, genres_dict, no_recommendation_from_playlist_artists):
+        self.seeds = {}
+        for genre, artists in genres_dict.items():
+            if no_recommendation_from_playlist_artists:
+                artists = [artist for artist in artists if artist[2] != ["playlists"]]
+            if artists:
+                self.seeds[genre] = artists
+        # genre or artist id -> (nb of accepted tracks, nb of rejected tracks)
+        self.genre_stats = {}
+        self.artist_stats = {}
+        self.nb_accepted = 0
+        self.nb_rejected = 0
+
+    def sample_acceptance_rate(self, stats, key):
+        nb_accepted, nb_rejected = stats.get(key, (0, 0))
+        global_acceptance_rate = (self.nb_accepted + 1) / (self.nb_accepted + self.nb_rejected + 2)
+        return random.betavariate(
+            self.prior_weight * global_acceptance_rate + nb_accepted,
+            self.prior_weight * (1 - global_acceptance_rate) + nb_rejected,
+        )
+
+    def choose(self):
+        genre = max(self.seeds, key=lambda genre: self.sample_acceptance_rate(self.genre_stats, genre))
+        artist = max(
+            self.seeds[genre], key=lambda artist: self.sample_acceptance_rate(self.artist_stats, artist[0])
+        )
+        return genre, artist
+
+    def update(self, genre, artist_id, nb_accepted, nb_rejected):
+        self.nb_accepted += nb_accepted
+        self.nb_rejected += nb_rejected
+        for stats, key in ((self.genre_stats, genre), (self.artist_stats, artist_id)):
+            previous_nb_accepted, previous_nb_rejected = stats.get(key, (0, 0))
+            stats[key] = (previous_nb_accepted + nb_accepted, previous_nb_rejected + nb_rejected)
+
+
+def is_budget_spent(nb_requests, max_requests, start_time, time_budget):
+    if nb_requests >= max_requests:
+        return True
+    return time_budget is not None and time.perf_counter() - start_time >= time_budget
+
+
+def log_budget_spent(nb_requests, max_requests, time_budget):
+    if nb_requests >= max_requests:
+        logging.info("request budget of %s requests spent", max_requests)
+    else:
+        logging.info("time budget of %ss spent", time_budget)
+
+
+def create_track_list(
+    access_token,
+    all_artists,
+    no_recommendation_from_playlist_artists,
+    length=100,
+    max_requests=50,
+    time_budget=None,
+):
+    """
+    Builds a list of recommended tracks from artists the user never listened to.
+
+    Seeds are chosen by a SeedSelector from the acceptance of the previous
+    recommendations. The generation stops when the list is full or when the
+    request or time budget is spent, the tracks found so far are returned.
+
+    Args:
+        access_token (str): Access token for authenticating API requests.
+        all_artists (list): Artists the user listened to, as returned by
+            get_all_artists_listenned_to.
+        no_recommendation_from_playlist_artists (bool): Do not use artists
+            only found in the user's playlists as seeds.
+        length (int, optional): Number of tracks wanted. Defaults to 100.
+        max_requests (int, optional): Maximum number of recommendation
+            requests. Defaults to 50.
+        time_budget (float, optional): Maximum number of seconds spent,
+            no limit if None. Defaults to None.
+
+    Returns:
+        list: Recommended tracks.
+    """
+    genres_dict = get_genres_dict(all_artists)
+    all_artists_ids = set(artist["id"] for artist in all_artists)
     logging.info("number of music genres %s", len(genres_dict))
     logging.info("number of artist ids %s", len(all_artists_ids))
 
-    track_list = []
-    artists_in_track_list_already = []
-    logging.info("cooking playlist ... (it will take at least 100s)")
-    for _ in range(50):
-        choice_not_valid = True
-        while choice_not_valid:
-            random_genre = random.choice(list(genres_dict.keys()))
-            random_artist = random.choice(genres_dict[random_genre])
-            random_artist_id = random_artist[0]
-            random_artist_name = random_artist[1]
-            random_artist_sources = random_artist[2]
-            if no_recommendation_from_playlist_artists:
-                if random_artist_sources == ["playlists"]:
-                    choice_not_valid = True
-                else:
-                    choice_not_valid = False
-            else:
-                choice_not_valid = False
-        recommended_tracks = get_recommendation_from_genre_and_artist(access_token, random_genre, random_artist_id)
-        logging.info("artist sources %s", random_artist_sources)
+    seed_selector = SeedSelector(genres_dict, no_recommendation_from_playlist_artists)
+    if not seed_selector.seeds:
+        logging.error("No artist with a genre to get recommendations from")
+        return []
 
+    track_list = []
+    track_ids_in_track_list = set()
+    artists_in_track_list_already = set()
+    nb_requests = 0
+    start_time = time.perf_counter()
+    logging.info("cooking playlist ...")
+    while len(track_list) < length and not is_budget_spent(nb_requests, max_requests, start_time, time_budget):
+        genre, (artist_id, artist_name, artist_sources) = seed_selector.choose()
+        recommended_tracks = get_recommendation_from_genre_and_artist(access_token, genre, artist_id)
+        nb_requests += 1
+        logging.info("artist sources %s", artist_sources)
+
+        nb_accepted = 0
         for track in recommended_tracks:
             recommended_artist_ids_in_track = [artist_in_track["id"] for artist_in_track in track["artists"]]
-            add_track = True
-            for recommended_artist_id_in_track in recommended_artist_ids_in_track:  # noqa: E501, E261
-                if recommended_artist_id_in_track in artists_in_track_list_already:
-                    add_track = False
-                    logging.info(
-                        "%s not added (artist already in generated tracklist)",
-                        track["name"],
-                    )
-                elif recommended_artist_id_in_track in all_artists_ids and add_track:
-                    add_track = False
-                    logging.info(
-                        "%s not added (artist already in list of listened artists)",
-                        track["name"],
-                    )
-                elif track in track_list and add_track:
-                    add_track = False
-                    logging.info(
-                        "%s not added (track already in generated tracklist)",
-                        track["name"],
-                    )
-            if add_track:
+            if any(
+                recommended_artist_id in artists_in_track_list_already
+                for recommended_artist_id in recommended_artist_ids_in_track
+            ):
+                logging.info(
+                    "%s not added (artist already in generated tracklist)",
+                    track["name"],
+                )
+            elif any(
+                recommended_artist_id in all_artists_ids
+                for recommended_artist_id in recommended_artist_ids_in_track
+            ):
+                logging.info(
+                    "%s not added (artist already in list of listened artists)",
+                    track["name"],
+                )
+            elif track["id"] in track_ids_in_track_list:
+                logging.info(
+                    "%s not added (track already in generated tracklist)",
+                    track["name"],
+                )
+            else:
                 track_list.append(track)
+                track_ids_in_track_list.add(track["id"])
+                artists_in_track_list_already.update(recommended_artist_ids_in_track)
+                nb_accepted += 1
                 logging.info(
                     "%s recommended from %s , %s, added",
                     track["name"],
-                    random_genre,
-                    random_artist_name,
+                    genre,
+                    artist_name,
+                )
+        # an empty answer is as useless as a fully rejected one
+        nb_rejected = len(recommended_tracks) - nb_accepted if recommended_tracks else 1
+        seed_selector.update(genre, artist_id, nb_accepted, nb_rejected)
+
+        # no need to wait after the last request
+        if len(track_list) < length and not is_budget_spent(nb_requests, max_requests, start_time, time_budget):
+            profiler.sleep(0.5)
+    if len(track_list) < length:
+        log_budget_spent(nb_requests, max_requests, time_budget)
+    logging.info(
+        "cooking finished :) %s tracks from %s requests (%.2f tracks per request) in %.1fs",
+        len(track_list),
+        nb_requests,
+        len(track_list) / max(nb_requests, 1),
+        time.perf_counter() - start_time,
+    )
+    return track_list[:length]
+
+
+DEFAULT_EXCLUSION_RULES = {
+    # do not use tracks recommended from artists only found in the user's playlists
+    "exclude_playlist_seed_artists": False,
+    # at most one track per artist in the playlist
+    "one_track_per_artist": True,
+    # a track already put in a previous playlist of the batch is not reused
+    "exclude_tracks_in_other_playlists": True,
+}
+
+
+SOURCES = ["top_artists", "top_tracks", "playlists"]
+
+
+def check_exclusion_rules(exclusion_rules, partition_by):
+    """
+    Checks the exclusion rules given for partition_candidate_pool.
+
+    Args:
+        exclusion_rules (dict): Rules overrides per genre cluster word or
+            source, under the "default" key for every track list.
+        partition_by (str): "genre" or "source".
+
+    Raises:
+        ValueError: If a key or a rule name is unknown.
+    """
+    if not isinstance(exclusion_rules, dict):
+        raise ValueError("the exclusion rules must be a json object")
+    for key, rules in exclusion_rules.items():
+        if " " in key:
+            raise ValueError(f"'{key}' contains a space, genre clusters are single words")
+        if partition_by == "source" and key not in ["default"] + SOURCES:
+            raise ValueError(f"unknown source '{key}', expected default or one of {', '.join(SOURCES)}")
+        if not isinstance(rules, dict):
+            raise ValueError(f"the rules of '{key}' must be a json object")
+        for rule in rules:
+            if rule not in DEFAULT_EXCLUSION_RULES:
+                raise ValueError(
+                    f"unknown rule '{rule}' for '{key}', expected one of {', '.join(DEFAULT_EXCLUSION_RULES)}"
+                )
+
+
+def get_exclusion_rules(exclusion_rules, key):
+    return {**DEFAULT_EXCLUSION_RULES, **exclusion_rules.get("default", {}), **exclusion_rules.get(key, {})}
+
+
+def is_excluded_everywhere(exclusion_rules, rule):
+    """
+    Tells if an exclusion rule is on for every track list: it is on by
+    default and no track list turns it off.
+    """
+    if not get_exclusion_rules(exclusion_rules, "default")[rule]:
+        return False
+    return all(rules.get(rule, True) for key, rules in exclusion_rules.items() if key != "default")
+
+
+def create_candidate_pool(
+    access_token,
+    all_artists,
+    max_requests=100,
+    time_budget=None,
+    limit=20,
+    exclusion_rules=None,
+):
+    """
+    Builds one large pool of recommended tracks that several playlists
+    can then be cut from, so that collection and recommendation requests
+    are shared between all of them.
+
+    Tracks from artists the user already listened to are never added
+    to the pool, the other exclusions depend on the playlist and are
+    applied in partition_candidate_pool. Seeds excluded from every
+    playlist are never requested. Seeds are chosen by a SeedSelector
+    and the gathering stops when the request or time budget is spent.
+
+    Args:
+        access_token (str): Access token for authenticating API requests.
+        all_artists (list): Artists the user listened to, as returned by
+            get_all_artists_listenned_to.
+        max_requests (int, optional): Maximum number of recommendation
+            requests. Defaults to 100.
+        time_budget (float, optional): Maximum number of seconds spent,
+            no limit if None. Defaults to None.
+        limit (int, optional): Number of tracks asked per recommendation
+            request. Defaults to 20.
+        exclusion_rules (dict, optional): Exclusion rules of the track
+            lists, see partition_candidate_pool. Defaults to None.
+
+    Returns:
+        list: Candidates, dictionaries with the track and the genre and
+            artist it was recommended from.
+    """
+    genres_dict = get_genres_dict(all_artists)
+    all_artists_ids = set(artist["id"] for artist in all_artists)
+    logging.info("number of music genres %s", len(genres_dict))
+    logging.info("number of artist ids %s", len(all_artists_ids))
+
+    seed_selector = SeedSelector(
+        genres_dict, is_excluded_everywhere(exclusion_rules or {}, "exclude_playlist_seed_artists")
+    )
+    if not seed_selector.seeds:
+        logging.error("No artist with a genre to get recommendations from")
+        return []
+
+    candidate_pool = []
+    track_ids_in_pool = set()
+    nb_requests = 0
+    start_time = time.perf_counter()
+    logging.info("gathering candidate tracks ...")
+    while not is_budget_spent(nb_requests, max_requests, start_time, time_budget):
+        genre, (artist_id, artist_name, artist_sources) = seed_selector.choose()
+        recommended_tracks = get_recommendation_from_genre_and_artist(access_token, genre, artist_id, limit=limit)
+        nb_requests += 1
+
+        nb_accepted = 0
+        for track in recommended_tracks:
+            if track["id"] in track_ids_in_pool:
+                continue
+            if any(artist_in_track["id"] in all_artists_ids for artist_in_track in track["artists"]):
+                logging.info(
+                    "%s not added (artist already in list of listened artists)",
+                    track["name"],
                 )
-                for artist_id in recommended_artist_ids_in_track:
-                    artists_in_track_list_already.append(artist_id)
+                continue
+            track_ids_in_pool.add(track["id"])
+            nb_accepted += 1
+            candidate_pool.append(
+                {
+                    "track": track,
+                    "seed_genre": genre,
+                    "seed_artist_name": artist_name,
+                    "seed_artist_sources": artist_sources,
+                }
+            )
+        nb_rejected = len(recommended_tracks) - nb_accepted if recommended_tracks else 1
+        seed_selector.update(genre, artist_id, nb_accepted, nb_rejected)
+
+        # no need to wait after the last request
+        if not is_budget_spent(nb_requests, max_requests, start_time, time_budget):
+            profiler.sleep(0.5)
+    log_budget_spent(nb_requests, max_requests, time_budget)
+    logging.info(
+        "%s candidate tracks gathered from %s requests in %.1fs",
+        len(candidate_pool),
+        nb_requests,
+        time.perf_counter() - start_time,
+    )
+    return candidate_pool
+
+
+def get_genre_clusters(genres, cluster_words=()):
+    """
+    Groups genres around a single word of their name, which is also the
+    name of the cluster. A genre goes to the first of cluster_words found
+    in its name, otherwise to its most common word (the last one on a
+    tie): "indie rock" and "french rock" both end up in the "rock" cluster,
+    "hip hop" in the "hop" cluster.
+
+    Args:
+        genres (list): Genre names.
+        cluster_words (list, optional): Words that always make their own
+            cluster. Defaults to ().
+
+    Returns:
+        dict: Genre -> cluster word.
+    """
+    genres = set(genres)
+    word_counts = {}
+    for genre in genres:
+        for word in genre.split():
+            word_counts[word] = word_counts.get(word, 0) + 1
+
+    genre_clusters = {}
+    for genre in genres:
+        words = genre.split()
+        forced_words = [word for word in cluster_words if word in words]
+        if forced_words:
+            genre_clusters[genre] = forced_words[0]
+        else:
+            genre_clusters[genre] = max(reversed(words), key=lambda word: word_counts[word])
+    return genre_clusters
+
 
-        if len(track_list) > length:
+def partition_candidate_pool(candidate_pool, partition_by="genre", nb_playlists=3, length=100, exclusion_rules=None):
+    """
+    Splits a candidate pool into several track lists, one per genre cluster
+    or per source of the seed artist (top_artists, top_tracks, playlists).
+    The largest groups left once the exclusion rules are applied are kept,
+    empty ones are skipped.
+
+    Args:
+        candidate_pool (list): Candidates returned by create_candidate_pool.
+        partition_by (str, optional): "genre" or "source". Defaults to "genre".
+        nb_playlists (int, optional): Maximum number of track lists.
+            Defaults to 3.
+        length (int, optional): Maximum number of tracks per track list.
+            Defaults to 100.
+        exclusion_rules (dict, optional): Overrides of DEFAULT_EXCLUSION_RULES,
+            under the "default" key for every track list and under the genre
+            cluster word or source name for a single one. Defaults to None.
+
+    Returns:
+        dict: Genre cluster word or source -> list of tracks.
+    """
+    if partition_by not in ["genre", "source"]:
+        raise ValueError(f"unknown partition {partition_by}, expected 'genre' or 'source'")
+    exclusion_rules = exclusion_rules or {}
+    genre_clusters = get_genre_clusters(
+        [candidate["seed_genre"] for candidate in candidate_pool],
+        cluster_words=[key for key in exclusion_rules if key != "default"],
+    )
+
+    candidates_by_key = {}
+    for candidate in candidate_pool:
+        if partition_by == "genre":
+            keys = [genre_clusters[candidate["seed_genre"]]]
+        else:
+            keys = candidate["seed_artist_sources"]
+        for key in keys:
+            candidates_by_key.setdefault(key, []).append(candidate)
+
+    # seed exclusions do not depend on the other track lists, apply them
+    # before ranking so that a group they empty does not take a slot
+    for key in list(candidates_by_key):
+        if get_exclusion_rules(exclusion_rules, key)["exclude_playlist_seed_artists"]:
+            candidates_by_key[key] = [
+                candidate for candidate in candidates_by_key[key] if candidate["seed_artist_sources"] != ["playlists"]
+            ]
+
+    keys = sorted(candidates_by_key, key=lambda key: len(candidates_by_key[key]), reverse=True)
+    track_lists = {}
+    track_ids_in_track_lists = set()
+    for key in keys:
+        if len(track_lists) >= nb_playlists:
             break
-        time.sleep(0.5)
-    logging.info("cooking finished :)")
-    return track_list
+        rules = get_exclusion_rules(exclusion_rules, key)
+        track_list = []
+        artists_in_track_list_already = set()
+        for candidate in candidates_by_key[key]:
+            track = candidate["track"]
+            recommended_artist_ids_in_track = [artist_in_track["id"] for artist_in_track in track["artists"]]
+            if rules["exclude_tracks_in_other_playlists"] and track["id"] in track_ids_in_track_lists:
+                continue
+            if rules["one_track_per_artist"] and any(
+                artist_id in artists_in_track_list_already for artist_id in recommended_artist_ids_in_track
+            ):
+                continue
+            track_list.append(track)
+            artists_in_track_list_already.update(recommended_artist_ids_in_track)
+            if len(track_list) >= length:
+                break
+        if not track_list:
+            logging.info("no track left for the %s track list", key)
+            continue
+        track_ids_in_track_lists.update(track["id"] for track in track_list)
+        logging.info("%s tracks in the %s track list", len(track_list), key)
+        track_lists[key] = track_list
+    return track_lists
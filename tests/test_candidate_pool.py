@@ -0,0 +1,216 @@
+import pytest
+
+import spotify_api_interface
+
+
+def make_candidate(track_id, artist_id, seed_genre="rock", seed_artist_sources=("top_artists",)):
+    return {
+        "track": {"id": track_id, "name": track_id, "artists": [{"id": artist_id}]},
+        "seed_genre": seed_genre,
+        "seed_artist_name": "seed",
+        "seed_artist_sources": list(seed_artist_sources),
+    }
+
+
+def track_ids(track_list):
+    return [track["id"] for track in track_list]
+
+
+def test_genre_clusters_use_most_common_word():
+    genre_clusters = spotify_api_interface.get_genre_clusters(
+        ["rock", "indie rock", "french rock", "indie pop", "hip hop", "french hip hop"]
+    )
+    assert genre_clusters == {
+        "rock": "rock",
+        "indie rock": "rock",
+        "french rock": "rock",
+        "indie pop": "indie",
+        # tie between "hip" and "hop", the last word wins
+        "hip hop": "hop",
+        "french hip hop": "hop",
+    }
+
+
+def test_genre_clusters_forced_words():
+    genre_clusters = spotify_api_interface.get_genre_clusters(
+        ["rock", "indie rock", "french rock", "indie pop"], cluster_words=["indie"]
+    )
+    assert genre_clusters == {"rock": "rock", "indie rock": "indie", "french rock": "rock", "indie pop": "indie"}
+
+
+def test_partition_ranks_groups_after_exclusions():
+    candidate_pool = [make_candidate(f"p{i}", f"p{i}", seed_artist_sources=["playlists"]) for i in range(5)]
+    candidate_pool += [make_candidate(f"a{i}", f"a{i}") for i in range(3)]
+    candidate_pool += [make_candidate(f"t{i}", f"t{i}", seed_artist_sources=["top_tracks"]) for i in range(2)]
+    track_lists = spotify_api_interface.partition_candidate_pool(
+        candidate_pool,
+        partition_by="source",
+        nb_playlists=2,
+        exclusion_rules={"default": {"exclude_playlist_seed_artists": True}},
+    )
+    assert {key: len(track_list) for key, track_list in track_lists.items()} == {"top_artists": 3, "top_tracks": 2}
+
+
+def test_partition_skips_groups_left_empty():
+    candidate_pool = [make_candidate("a0", "a0"), make_candidate("a1", "a1", seed_artist_sources=["top_tracks"])]
+    candidate_pool.append(make_candidate("a0", "a0", seed_artist_sources=["playlists"]))
+    track_lists = spotify_api_interface.partition_candidate_pool(candidate_pool, partition_by="source")
+    # the only playlists track is already in the top_artists track list
+    assert list(track_lists) == ["top_artists", "top_tracks"]
+
+
+def test_partition_shared_sources():
+    candidate_pool = [
+        make_candidate("shared", "x", seed_artist_sources=["top_tracks", "top_artists"]),
+        make_candidate("a0", "a0"),
+        make_candidate("a1", "a1"),
+        make_candidate("t0", "t0", seed_artist_sources=["top_tracks"]),
+    ]
+    # top_artists is the largest group so it gets the shared track first
+    track_lists = spotify_api_interface.partition_candidate_pool(candidate_pool, partition_by="source")
+    assert track_ids(track_lists["top_artists"]) == ["shared", "a0", "a1"]
+    assert track_ids(track_lists["top_tracks"]) == ["t0"]
+
+    track_lists = spotify_api_interface.partition_candidate_pool(
+        candidate_pool,
+        partition_by="source",
+        exclusion_rules={"top_tracks": {"exclude_tracks_in_other_playlists": False}},
+    )
+    assert track_ids(track_lists["top_tracks"]) == ["shared", "t0"]
+
+
+def test_partition_rules_per_genre_cluster():
+    candidate_pool = [
+        make_candidate("r0", "same", seed_genre="indie rock"),
+        make_candidate("r1", "same", seed_genre="indie rock"),
+        make_candidate("r2", "other", seed_genre="rock"),
+        make_candidate("j0", "jazz0", seed_genre="jazz"),
+    ]
+    track_lists = spotify_api_interface.partition_candidate_pool(candidate_pool)
+    assert track_ids(track_lists["rock"]) == ["r0", "r2"]
+
+    track_lists = spotify_api_interface.partition_candidate_pool(
+        candidate_pool, exclusion_rules={"indie": {"one_track_per_artist": False}}
+    )
+    assert track_ids(track_lists["indie"]) == ["r0", "r1"]
+    assert track_ids(track_lists["rock"]) == ["r2"]
+    assert track_ids(track_lists["jazz"]) == ["j0"]
+
+
+def test_partition_length_and_nb_playlists():
+    candidate_pool = [make_candidate(f"r{i}", f"r{i}") for i in range(10)]
+    candidate_pool += [make_candidate(f"j{i}", f"j{i}", seed_genre="jazz") for i in range(5)]
+    track_lists = spotify_api_interface.partition_candidate_pool(candidate_pool, nb_playlists=1, length=4)
+    assert track_ids(track_lists["rock"]) == ["r0", "r1", "r2", "r3"]
+    assert list(track_lists) == ["rock"]
+
+
+def test_partition_unknown():
+    with pytest.raises(ValueError):
+        spotify_api_interface.partition_candidate_pool([], partition_by="mood")
+
+
+def test_is_excluded_everywhere():
+    rule = "exclude_playlist_seed_artists"
+    assert not spotify_api_interface.is_excluded_everywhere({}, rule)
+    assert spotify_api_interface.is_excluded_everywhere({"default": {rule: True}}, rule)
+    assert spotify_api_interface.is_excluded_everywhere({"default": {rule: True}, "rock": {}}, rule)
+    assert not spotify_api_interface.is_excluded_everywhere({"default": {rule: True}, "rock": {rule: False}}, rule)
+    # on by default for every track list but one: still requested for that one
+    assert not spotify_api_interface.is_excluded_everywhere({"rock": {rule: True}}, rule)
+
+
+@pytest.mark.parametrize(
+    "exclusion_rules, partition_by",
+    [
+        ([], "genre"),
+        ({"hip hop": {}}, "genre"),
+        ({"rock": {"one_track_per_artst": True}}, "genre"),
+        ({"rock": True}, "genre"),
+        ({"rock": {}}, "source"),
+    ],
+)
+def test_check_exclusion_rules_rejects(exclusion_rules, partition_by):
+    with pytest.raises(ValueError):
+        spotify_api_interface.check_exclusion_rules(exclusion_rules, partition_by)
+
+
+def test_check_exclusion_rules_accepts():
+    spotify_api_interface.check_exclusion_rules(
+        {"default": {"one_track_per_artist": False}, "playlists": {"exclude_playlist_seed_artists": True}}, "source"
+    )
+
+
+@pytest.fixture
+def requested_seeds(monkeypatch):
+    requested_seeds = []
+
+    def get_recommendation_from_genre_and_artist(access_token, genre, artist, limit=5, **kwargs):
+        requested_seeds.append(artist)
+        return [
+            {"id": f"{artist}-track", "name": "track", "artists": [{"id": f"new-{artist}"}]},
+            {"id": "listened-track", "name": "track", "artists": [{"id": "listened"}]},
+        ]
+
+    monkeypatch.setattr(
+        spotify_api_interface, "get_recommendation_from_genre_and_artist", get_recommendation_from_genre_and_artist
+    )
+    monkeypatch.setattr(spotify_api_interface.profiler, "sleep", lambda seconds: None)
+    return requested_seeds
+
+
+ALL_ARTISTS = [
+    {"id": "playlist-artist", "name": "a", "genres": ["rock"], "sources": ["playlists"]},
+    {"id": "top-artist", "name": "b", "genres": ["rock"], "sources": ["top_artists"]},
+    {"id": "listened", "name": "c", "genres": [], "sources": ["top_tracks"]},
+]
+
+
+def test_candidate_pool_skips_seeds_excluded_everywhere(requested_seeds):
+    candidate_pool = spotify_api_interface.create_candidate_pool(
+        "token", ALL_ARTISTS, exclusion_rules={"default": {"exclude_playlist_seed_artists": True}}
+    )
+    assert set(requested_seeds) == {"top-artist"}
+    assert [candidate["track"]["id"] for candidate in candidate_pool] == ["top-artist-track"]
+
+
+def test_candidate_pool_keeps_seeds_used_by_one_playlist(requested_seeds):
+    candidate_pool = spotify_api_interface.create_candidate_pool(
+        "token",
+        ALL_ARTISTS,
+        exclusion_rules={
+            "default": {"exclude_playlist_seed_artists": True},
+            "playlists": {"exclude_playlist_seed_artists": False},
+        },
+    )
+    assert set(requested_seeds) == {"top-artist", "playlist-artist"}
+    # listened artists are never in the pool and tracks are not duplicated
+    assert sorted(candidate["track"]["id"] for candidate in candidate_pool) == [
+        "playlist-artist-track",
+        "top-artist-track",
+    ]
+
+
+def test_create_and_populate_playlists_in_one_batch(monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        spotify_api_interface,
+        "create_playlist",
+        lambda access_token, user_href, name, description, public: calls.append(("create", name)) or f"id-{name}",
+    )
+    monkeypatch.setattr(
+        spotify_api_interface,
+        "add_tracks_to_playlist",
+        lambda access_token, user_href, playlist_id, tracks: calls.append(("add", playlist_id, len(tracks))),
+    )
+    monkeypatch.setattr(spotify_api_interface.profiler, "sleep", lambda seconds: calls.append(("sleep", seconds)))
+    spotify_api_interface.create_and_populate_playlists(
+        "token", "href", {"rock": [{"id": "r0"}], "jazz": [{"id": "j0"}, {"id": "j1"}]}
+    )
+    assert calls == [
+        ("create", "rock"),
+        ("create", "jazz"),
+        ("sleep", 5),
+        ("add", "id-rock", 1),
+        ("add", "id-jazz", 2),
+    ]
@@ -0,0 +1,85 @@
+import json
+
+import pytest
+import requests
+
+import profiler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def perf_counter(self):
+        return self.now
+
+    def process_time(self):
+        return 0.0
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def strftime(self, format):
+        return "run"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(profiler, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def stub_send(monkeypatch, clock):
+    """
+    Each send takes 0.1s, "/redirect" is followed by sending the
+    redirected request through Session.send again, like requests does.
+    """
+
+    def send(session, request, **kwargs):
+        clock.sleep(0.1)
+        if request.path_url == "/redirect":
+            redirected_request = requests.Request("GET", "https://example.com/target").prepare()
+            return session.send(redirected_request, **kwargs)
+        return "response"
+
+    monkeypatch.setattr(requests.Session, "send", send)
+    return send
+
+
+def test_stages_sum_sleep_and_network_time(tmp_path, clock, stub_send):
+    profiler.enable(output_folder=str(tmp_path))
+    try:
+        with profiler.stage("outer"):
+            profiler.sleep(0.5)
+            with profiler.stage("inner"):
+                profiler.sleep(0.25)
+                requests.Session().get("https://example.com/redirect")
+    finally:
+        trace_file = profiler.report()
+
+    assert requests.Session.send is stub_send
+    with open(trace_file, "r") as f:
+        trace_events = json.load(f)["traceEvents"]
+
+    stage_events = {event["name"]: event for event in trace_events if event["cat"] == "stage"}
+    assert stage_events["inner"]["args"]["sleep_time"] == pytest.approx(0.25)
+    assert stage_events["inner"]["args"]["network_time"] == pytest.approx(0.2)
+    assert stage_events["inner"]["args"]["nb_network_calls"] == 1
+    assert stage_events["outer"]["args"]["sleep_time"] == pytest.approx(0.75)
+    assert stage_events["outer"]["args"]["network_time"] == pytest.approx(0.2)
+    assert stage_events["outer"]["args"]["nb_network_calls"] == 1
+    assert stage_events["outer"]["dur"] == pytest.approx(0.95e6)
+    assert stage_events["outer"]["args"]["peak_memory"] >= stage_events["inner"]["args"]["peak_memory"]
+
+    network_events = [event for event in trace_events if event["cat"] == "network"]
+    assert [event["name"] for event in network_events] == ["GET /redirect"]
+    assert len([event for event in trace_events if event["cat"] == "sleep"]) == 2
+
+
+def test_stage_does_nothing_when_disabled(clock):
+    with profiler.stage("stage"):
+        profiler.sleep(0.5)
+    assert clock.now == 0.5
+    assert profiler.report() is None
@@ -0,0 +1,164 @@
+import random
+
+import pytest
+
+import spotify_api_interface
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def perf_counter(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(spotify_api_interface, "time", clock)
+    monkeypatch.setattr(spotify_api_interface.profiler, "sleep", clock.sleep)
+    return clock
+
+
+def make_artists(nb_artists=20, nb_genres=4, sources=("top_artists",)):
+    return [
+        {"id": f"artist{i}", "name": f"artist {i}", "genres": [f"genre{i % nb_genres}"], "sources": list(sources)}
+        for i in range(nb_artists)
+    ]
+
+
+def fake_recommendations(monkeypatch, new_artist_probability, limit=5):
+    """
+    Every recommended track is by a new artist with the probability of
+    its seed artist, by an already listened artist otherwise.
+    """
+    calls = []
+
+    def get_recommendation_from_genre_and_artist(access_token, genre, artist, limit=limit, **kwargs):
+        calls.append((genre, artist))
+        tracks = []
+        for _ in range(limit):
+            track_number = len(calls) * 1000 + len(tracks)
+            if random.random() < new_artist_probability(artist):
+                artist_id = f"new{track_number}"
+            else:
+                artist_id = "artist0"
+            tracks.append({"id": f"track{track_number}", "name": "track", "artists": [{"id": artist_id}]})
+        return tracks
+
+    monkeypatch.setattr(
+        spotify_api_interface, "get_recommendation_from_genre_and_artist", get_recommendation_from_genre_and_artist
+    )
+    return calls
+
+
+def test_seed_selector_prefers_productive_seeds():
+    random.seed(0)
+    genres_dict = {"good": [["a", "a", ["top_artists"]]], "bad": [["b", "b", ["top_artists"]]]}
+    seed_selector = spotify_api_interface.SeedSelector(genres_dict, False)
+    seed_selector.update("good", "a", 5, 0)
+    seed_selector.update("bad", "b", 0, 5)
+    choices = [seed_selector.choose()[0] for _ in range(100)]
+    assert choices.count("good") > 90
+
+
+def test_seed_selector_drops_playlist_only_artists():
+    genres_dict = {
+        "rock": [["a", "a", ["playlists"]], ["b", "b", ["playlists", "top_artists"]]],
+        "jazz": [["c", "c", ["playlists"]]],
+    }
+    seed_selector = spotify_api_interface.SeedSelector(genres_dict, True)
+    assert seed_selector.seeds == {"rock": [["b", "b", ["playlists", "top_artists"]]]}
+
+
+def test_create_track_list_stops_when_full(monkeypatch, clock):
+    calls = fake_recommendations(monkeypatch, lambda artist: 1)
+    track_list = spotify_api_interface.create_track_list("token", make_artists(), False, length=12)
+    assert len(track_list) == 12
+    assert len(calls) == 3
+
+
+def test_create_track_list_stops_on_request_budget(monkeypatch, clock):
+    calls = fake_recommendations(monkeypatch, lambda artist: 0)
+    track_list = spotify_api_interface.create_track_list("token", make_artists(), False, max_requests=7)
+    assert track_list == []
+    assert len(calls) == 7
+    # no wait after the last request
+    assert clock.now == 3.0
+
+
+def test_create_track_list_stops_on_time_budget(monkeypatch, clock):
+    calls = fake_recommendations(monkeypatch, lambda artist: 0)
+    track_list = spotify_api_interface.create_track_list("token", make_artists(), False, time_budget=2)
+    assert track_list == []
+    # 0.5s of sleep after each request
+    assert len(calls) == 4
+
+
+def test_create_track_list_without_seeds(monkeypatch, clock):
+    calls = fake_recommendations(monkeypatch, lambda artist: 1)
+    track_list = spotify_api_interface.create_track_list("token", make_artists(sources=("playlists",)), True)
+    assert track_list == []
+    assert calls == []
+
+
+def test_empty_answer_counts_as_rejection(monkeypatch, clock):
+    random.seed(0)
+    updates = []
+    monkeypatch.setattr(
+        spotify_api_interface.SeedSelector, "update", lambda self, *args: updates.append(args)
+    )
+    monkeypatch.setattr(spotify_api_interface, "get_recommendation_from_genre_and_artist", lambda *args: [])
+    spotify_api_interface.create_track_list("token", make_artists(), False, max_requests=1)
+    assert len(updates) == 1
+    assert updates[0][2:] == (0, 1)
+
+
+def test_adaptive_selection_needs_fewer_requests_than_random(monkeypatch, clock):
+    """
+    Simulation: seed artists of the same genre have a similar chance of
+    being recommended new artists. Filling a 100 tracks list should take
+    clearly fewer requests than drawing the seeds at random.
+    """
+    nb_genres = 20
+    artists = make_artists(nb_artists=400, nb_genres=nb_genres)
+    calls = fake_recommendations(monkeypatch, lambda artist: new_artist_probability[artist])
+
+    def random_choice(self):
+        genre = random.choice(list(self.seeds))
+        return genre, random.choice(self.seeds[genre])
+
+    nb_requests = {"adaptive": 0, "random": 0}
+    for run in range(10):
+        world = random.Random(run)
+        genre_probability = [world.random() ** 3 for _ in range(nb_genres)]
+        new_artist_probability = {
+            artist["id"]: min(1, 2 * genre_probability[i % nb_genres] * world.random())
+            for i, artist in enumerate(artists)
+        }
+        for mode in nb_requests:
+            random.seed(run)
+            with monkeypatch.context() as patch:
+                if mode == "random":
+                    patch.setattr(spotify_api_interface.SeedSelector, "choose", random_choice)
+                calls.clear()
+                spotify_api_interface.create_track_list("token", artists, False, max_requests=1000)
+            nb_requests[mode] += len(calls)
+
+    assert nb_requests["adaptive"] < 0.8 * nb_requests["random"]
+
+
+def test_create_candidate_pool_stops_on_budgets(monkeypatch, clock):
+    calls = fake_recommendations(monkeypatch, lambda artist: 1, limit=20)
+    candidate_pool = spotify_api_interface.create_candidate_pool("token", make_artists(), max_requests=3)
+    assert len(calls) == 3
+    assert len(candidate_pool) == 60
+    assert clock.now == 1.0
+
+    calls.clear()
+    spotify_api_interface.create_candidate_pool("token", make_artists(), time_budget=2)
+    assert len(calls) == 4